@@ -4,16 +4,250 @@ load_dotenv()
 
 import os
 import io
+import json
+import atexit
+import random
+import asyncio
+import threading
 import traceback
+import numpy as np
 import streamlit as st
-from groq import Groq
 
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import ParagraphStyle
-from reportlab.lib import colors
-from reportlab.lib.units import mm
-from xml.sax.saxutils import escape
+try:
+    from sentence_transformers import SentenceTransformer
+except ImportError:
+    SentenceTransformer = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = prange = None
+
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+# orjson parses/serializes 2–5x faster than stdlib json; fall back when missing.
+if orjson is not None:
+    _json_loads = orjson.loads
+    def _json_dumps(obj) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+else:
+    _json_loads = json.loads
+    def _json_dumps(obj) -> bytes:
+        return json.dumps(obj).encode()
+
+# -------------------------
+# SEMANTIC RESPONSE CACHE
+# -------------------------
+CACHE_PATH = "./cache.npz"
+INDEX_PATH = "./cache.hnsw"
+CACHE_THRESHOLD = 0.92
+_HNSW_MAX = 100_000
+_SAVE_EVERY = 8  # persist after this many new entries (and at exit)
+
+# Embeddings are stored quantized to int8 (per-component, unit scale 1/127):
+# 4x less memory traffic than float32 on a memory-bound scan, and the dot
+# product stays exact enough for a 0.92 cosine threshold.
+_INT8_SCALE = np.float32(1.0 / 127**2)
+
+def _quantize(v):
+    """Quantize an L2-normalized float32 vector to int8."""
+    return np.round(v * 127.0).astype(np.int8)
+
+if njit is not None:
+    @njit(cache=True, parallel=True, fastmath=True)
+    def _topk_sim(M, q, k):
+        """Top-k dot products of q against the rows of M, as native code."""
+        n = M.shape[0]
+        sims = np.empty(n, dtype=np.float32)
+        for i in prange(n):
+            acc = np.float32(0.0)
+            for j in range(M.shape[1]):
+                acc += np.float32(M[i, j]) * np.float32(q[j])
+            sims[i] = acc
+        idx = np.zeros(k, dtype=np.int64)
+        vals = np.full(k, -np.inf, dtype=np.float32)
+        for i in range(n):
+            s = sims[i]
+            if s > vals[k - 1]:
+                pos = k - 1
+                while pos > 0 and s > vals[pos - 1]:
+                    vals[pos] = vals[pos - 1]
+                    idx[pos] = idx[pos - 1]
+                    pos -= 1
+                vals[pos] = s
+                idx[pos] = i
+        return idx, vals
+else:
+    _topk_sim = None
+
+class SemanticCache:
+    """
+    Embeddings-based cache for Groq replies. Near-identical queries
+    ("explain photosynthesis" vs "what is photosynthesis") hit the cache
+    and return instantly with zero Groq tokens. Only the user-specific
+    text is embedded; the fixed parts (system prompt, difficulty, model,
+    temperature) form an exact-match scope so prompts that must produce
+    different answers never collide. Disabled (pass-through) when
+    sentence-transformers is not installed.
+    """
+    def __init__(self, path=CACHE_PATH, index_path=INDEX_PATH, threshold=CACHE_THRESHOLD):
+        self.path = path
+        self.index_path = index_path
+        self.threshold = threshold
+        self.model = SentenceTransformer("all-MiniLM-L6-v2") if SentenceTransformer else None
+        self.embeddings = None  # (N, D) int8, quantized from L2-normalized float32
+        self.responses = []
+        self.scopes = []  # exact-match key per entry, parallel to responses
+        self.index = None  # hnswlib ANN index when available; else linear scan
+        self._pending = 0  # inserts since the last save
+        # one instance is shared by every session's script thread plus the
+        # to_thread workers of gathered coroutines; RLock since insert
+        # flushes while already holding the lock
+        self._lock = threading.RLock()
+        self._load()
+
+    def _ensure_index(self, dim: int):
+        """Lazily create (or load) the HNSW index once the dim is known.
+
+        A loaded index must agree with the response list — an orphaned
+        cache.hnsw (e.g. the npz write failed or was deleted) would
+        otherwise return labels past the end of self.responses.
+        """
+        if hnswlib is None or self.index is not None:
+            return self.index
+        capacity = max(_HNSW_MAX, len(self.responses))
+        index = hnswlib.Index(space="cosine", dim=dim)
+        try:
+            index.load_index(self.index_path, max_elements=capacity)
+            if index.get_current_count() != len(self.responses):
+                raise ValueError("index out of sync with responses")
+        except Exception:
+            index = hnswlib.Index(space="cosine", dim=dim)
+            index.init_index(max_elements=capacity, ef_construction=200, M=16)
+            if self.embeddings is not None and self.responses:
+                # rebuild from the persisted matrix
+                index.add_items(self.embeddings.astype(np.float32) / 127.0,
+                                np.arange(len(self.responses)))
+        self.index = index
+        return index
+
+    def _load(self):
+        if self.model and os.path.exists(self.path):
+            try:
+                data = np.load(self.path)
+                emb = data["embeddings"]
+                # re-quantize caches persisted before the int8 format
+                self.embeddings = emb if emb.dtype == np.int8 else _quantize(emb)
+                payload = _json_loads(data["responses"].tobytes())
+                if isinstance(payload, dict):
+                    self.responses = payload["responses"]
+                    self.scopes = payload["scopes"]
+                else:
+                    # cache persisted before scopes existed
+                    self.responses = payload
+                    self.scopes = [""] * len(payload)
+                self._ensure_index(self.embeddings.shape[1])
+            except Exception:
+                self.embeddings, self.responses, self.scopes, self.index = None, [], [], None
+
+    def _save(self):
+        try:
+            payload = {"responses": self.responses, "scopes": self.scopes}
+            np.savez(self.path, embeddings=self.embeddings,
+                     responses=np.frombuffer(_json_dumps(payload), dtype=np.uint8))
+            if self.index is not None:
+                self.index.save_index(self.index_path)
+        except Exception:
+            pass  # cache persistence is best-effort
+
+    def _embed(self, prompt: str):
+        v = self.model.encode(prompt).astype(np.float32)
+        norm = np.linalg.norm(v)
+        return v / norm if norm else v
+
+    def lookup(self, text: str, scope: str = ""):
+        """Return (cached_response_or_None, query_embedding_or_None)."""
+        if not self.model:
+            return None, None
+        q = self._embed(text)  # slow encode stays outside the lock
+        with self._lock:
+            if self.embeddings is None or not self.responses:
+                return None, q
+            index = self._ensure_index(q.shape[0])
+            if index is not None and index.get_current_count():
+                # O(log N) graph walk instead of the O(N*D) scan; over-fetch
+                # a few neighbors and keep the first one in the right scope
+                k = min(8, index.get_current_count())
+                ids, dists = index.knn_query(q, k=k)
+                for label, dist in zip(ids[0], dists[0]):
+                    if float(dist) >= 1.0 - self.threshold:
+                        break  # dists are sorted ascending
+                    if self.scopes[int(label)] == scope:
+                        return self.responses[int(label)], q
+                return None, q
+            rows = np.array([i for i, s in enumerate(self.scopes) if s == scope], dtype=np.int64)
+            if not rows.size:
+                return None, q
+            M = self.embeddings[rows]
+            q8 = _quantize(q)
+            if _topk_sim is not None:
+                idx, vals = _topk_sim(M, q8, 1)
+                best, best_sim = int(rows[idx[0]]), float(vals[0] * _INT8_SCALE)
+            else:
+                sims = (M.astype(np.int16) @ q8.astype(np.int16)).astype(np.float32) * _INT8_SCALE
+                best = int(rows[np.argmax(sims)])
+                best_sim = float(sims.max())
+            if best_sim > self.threshold:
+                return self.responses[best], q
+            return None, q
+
+    def insert(self, q, response: str, scope: str = ""):
+        if self.model is None or q is None:
+            return
+        row = _quantize(q)[None, :]
+        with self._lock:
+            self.embeddings = row if self.embeddings is None else np.vstack([self.embeddings, row])
+            self.responses.append(response)
+            self.scopes.append(scope)
+            index = self._ensure_index(q.shape[0])
+            if index is not None:
+                # hnswlib raises once max_elements is reached — grow first
+                if index.get_current_count() >= index.get_max_elements():
+                    index.resize_index(index.get_max_elements() * 2)
+                index.add_items(q[None, :], np.array([len(self.responses) - 1]))
+            # rewriting the whole matrix + index per miss is O(N) disk work;
+            # batch it instead and flush the tail at interpreter exit
+            self._pending += 1
+            if self._pending >= _SAVE_EVERY:
+                self.flush()
+
+    def flush(self):
+        with self._lock:
+            if self._pending:
+                self._save()
+                self._pending = 0
+
+def _warmup(dim: int = 384):
+    """Run the JIT kernel once on a dummy matrix so the compile (or the
+    cache=True reload of already-compiled code) happens at startup instead
+    of stalling the first real lookup."""
+    if _topk_sim is not None:
+        _topk_sim(np.zeros((4, dim), dtype=np.int8), np.zeros(dim, dtype=np.int8), 1)
+
+@st.cache_resource(show_spinner=False)
+def get_semantic_cache():
+    _warmup()
+    cache = SemanticCache()
+    atexit.register(cache.flush)
+    return cache
 
 # -------------------------
 # GROQ CLIENT
@@ -21,114 +255,335 @@ from xml.sax.saxutils import escape
 GROQ_API_KEY = os.getenv("GROQ_API_KEY") or ""
 if not GROQ_API_KEY:
     st.warning("⚠️ GROQ_API_KEY not set in .env — Groq calls will fail.")
-client = Groq(api_key=GROQ_API_KEY) if GROQ_API_KEY else None
 
-def groq_chat(prompt: str, model="llama-3.1-8b-instant", temperature=0.5, max_retries=2):
-    """Robust wrapper for Groq chat completions."""
-    if not client:
+# include full tracebacks in failure replies; an env var rather than
+# st.session_state because agroq_chat runs on the background loop thread,
+# where Streamlit has no ScriptRunContext and session state is a dummy
+DEBUG = os.getenv("TUTOR_DEBUG", "").lower() in ("1", "true", "yes")
+
+@st.cache_resource(show_spinner=False)
+def _get_groq_clients():
+    """Build the sync/async Groq clients once per process, not per rerun,
+    so the keep-alive connections survive widget interactions."""
+    if not GROQ_API_KEY:
+        return None, None
+    import httpx
+    from groq import Groq, AsyncGroq
+    try:
+        import h2  # noqa: F401 — httpx's optional http2 extra
+        http2 = True
+    except ImportError:
+        http2 = False
+    # One keep-alive connection (HTTP/2 when h2 is installed) shared across
+    # calls: concurrent prompts multiplex on it instead of paying a TLS
+    # handshake each.
+    limits = httpx.Limits(max_connections=64, max_keepalive_connections=32)
+    return (
+        Groq(api_key=GROQ_API_KEY,
+             http_client=httpx.Client(http2=http2, limits=limits, timeout=30)),
+        AsyncGroq(api_key=GROQ_API_KEY,
+                  http_client=httpx.AsyncClient(http2=http2, limits=limits, timeout=30)),
+    )
+
+client, aclient = _get_groq_clients()
+
+# All async Groq work runs on one long-lived loop in a daemon thread.
+# asyncio.run would spin up (and close) a loop per call, killing the pooled
+# keep-alive connections the shared AsyncClient holds between calls.
+@st.cache_resource(show_spinner=False)
+def _get_async_loop():
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="groq-loop", daemon=True).start()
+    return loop
+
+def _run_async(coro):
+    """Run a coroutine to completion on the persistent background loop."""
+    return asyncio.run_coroutine_threadsafe(coro, _get_async_loop()).result()
+
+async def agroq_chat(prompt: str, model="llama-3.1-8b-instant", temperature=0.5, max_retries=2,
+                     response_format=None, cache_text=None, cache_scope=""):
+    """Robust async wrapper for Groq chat completions.
+
+    cache_text is the user-specific part of the prompt used for the semantic
+    lookup (defaults to the full prompt); cache_scope names the fixed parts
+    so entries with different instructions never match each other.
+    """
+    if not aclient:
         return "Groq client not configured. Set GROQ_API_KEY in .env."
+    cache = get_semantic_cache()
+    text = cache_text if cache_text is not None else prompt
+    scope = f"{cache_scope}|{model}|{temperature}"
+    # model.encode and the cache write are blocking CPU/disk work — keep
+    # them off the loop so gathered siblings make progress meanwhile
+    cached, q = await asyncio.to_thread(cache.lookup, text, scope)
+    if cached is not None:
+        return cached
     for attempt in range(max_retries + 1):
         try:
-            resp = client.chat.completions.create(
+            kwargs = {"response_format": response_format} if response_format else {}
+            resp = await aclient.chat.completions.create(
                 model=model,
                 messages=[{"role": "user", "content": prompt}],
-                temperature=temperature
+                temperature=temperature,
+                **kwargs
             )
-            # robust extraction
-            choice = getattr(resp, "choices", None)
-            if choice:
-                # attempt to fetch message.content
-                first = choice[0]
-                message = getattr(first, "message", None)
-                if message:
-                    # message may be object-like or dict-like
-                    content = getattr(message, "content", None)
-                    if content:
-                        return content
-                    if isinstance(message, dict):
-                        return message.get("content", str(resp))
-                # fallback
-                for attr in ("text", "content"):
-                    if hasattr(first, attr):
-                        return getattr(first, attr)
-            # last fallback
-            return str(resp)
+            # the SDK always exposes choices[0].message.content as a string
+            try:
+                content = resp.choices[0].message.content
+            except (AttributeError, IndexError):
+                return str(resp)
         except Exception as e:
             if attempt < max_retries:
-                import time
-                time.sleep(0.8 + attempt * 0.5)
+                # repr(e) is cheap; save the full traceback walk for give-up
+                print(f"Groq attempt {attempt + 1} failed, retrying: {e!r}")
+                # non-blocking backoff with jitter so concurrent retries
+                # neither stall the event loop nor thunder in lock-step
+                await asyncio.sleep(0.8 + attempt * 0.5 + random.uniform(0, 0.3))
                 continue
-            return f"Groq request failed: {e}\n{traceback.format_exc()}"
+            if DEBUG:
+                return f"Groq request failed: {e}\n{traceback.format_exc()}"
+            return f"Groq request failed: {e!r}"
+        # cache write is best-effort, outside the retry try: a failure here
+        # must never discard or re-request a successfully received reply
+        try:
+            await asyncio.to_thread(cache.insert, q, content, scope)
+        except Exception:
+            pass
+        return content
+
+def groq_chat(prompt: str, model="llama-3.1-8b-instant", temperature=0.5, max_retries=2,
+              response_format=None, cache_text=None, cache_scope=""):
+    """Synchronous entry point — runs a single async chat call to completion."""
+    return _run_async(agroq_chat(prompt, model=model, temperature=temperature,
+                                 max_retries=max_retries, response_format=response_format,
+                                 cache_text=cache_text, cache_scope=cache_scope))
+
+def groq_chat_stream(prompt: str, model="llama-3.1-8b-instant", temperature=0.5,
+                     cache_text=None, cache_scope=""):
+    """Yield response deltas as they arrive so the UI can paint while Groq streams."""
+    if not client:
+        yield "Groq client not configured. Set GROQ_API_KEY in .env."
+        return
+    cache = get_semantic_cache()
+    text = cache_text if cache_text is not None else prompt
+    scope = f"{cache_scope}|{model}|{temperature}"
+    cached, q = cache.lookup(text, scope)
+    if cached is not None:
+        yield cached
+        return
+    try:
+        resp = client.chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=temperature,
+            stream=True
+        )
+        parts = []
+        for chunk in resp:
+            delta = chunk.choices[0].delta.content or ""
+            parts.append(delta)
+            yield delta
+    except Exception as e:
+        yield f"Groq request failed: {e}"
+        return
+    try:
+        cache.insert(q, "".join(parts), scope)
+    except Exception:
+        pass  # best-effort, like _save
+
+def groq_chat_many(prompts, model="llama-3.1-8b-instant", temperature=0.5, max_retries=2,
+                   cache_texts=None, cache_scope=""):
+    """Fan out N prompts concurrently and return their replies in order."""
+    texts = cache_texts if cache_texts is not None else [None] * len(prompts)
+    async def _gather():
+        return await asyncio.gather(
+            *[agroq_chat(p, model=model, temperature=temperature, max_retries=max_retries,
+                         cache_text=t, cache_scope=cache_scope)
+              for p, t in zip(prompts, texts)]
+        )
+    return _run_async(_gather())
 
 # -------------------------
 # AI TUTOR ENGINE
 # -------------------------
-def ask_tutor(prompt):
-    system = (
-        "You are a friendly, safe AI home tutor for kids aged 6–14. "
-        "Explain concepts simply using short sentences, examples, and emojis. "
-        "Keep tone positive and age-appropriate. Include a 2–3 question mini-quiz at the end."
+_TUTOR_SYS = (
+    "You are a friendly, safe AI home tutor for kids aged 6–14. "
+    "Explain concepts simply using short sentences, examples, and emojis. "
+    "Keep tone positive and age-appropriate. "
+    'Return JSON with keys: explanation (string), examples (list of strings), '
+    'quiz (list of {"q": ..., "a": ...}), tips (list of strings).'
+)
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def _ask_tutor_cached(topic: str, difficulty: str):
+    prompt = (
+        f"Topic: {topic}\nDifficulty: {difficulty}\n"
+        "Explain step-by-step with emojis, 1–2 examples, a short fun quiz (2 questions), and learning tips."
     )
-    full_prompt = f"{system}\n\nUser request:\n{prompt}"
-    return groq_chat(full_prompt, temperature=0.5)
+    full_prompt = "".join((_TUTOR_SYS, "\n\nUser request:\n", prompt))
+    # only the topic is embedded; the difficulty must match exactly
+    reply = groq_chat(full_prompt, temperature=0.5, response_format={"type": "json_object"},
+                      cache_text=topic, cache_scope=f"tutor|{difficulty}")
+    try:
+        return _json_loads(reply)
+    except (ValueError, TypeError):
+        # raise past st.cache_data so error replies are never memoized
+        raise RuntimeError(reply if isinstance(reply, str) else str(reply))
+
+def ask_tutor(topic: str, difficulty: str):
+    """One Groq round trip returning the lesson as a dict of sections."""
+    try:
+        return _ask_tutor_cached(topic, difficulty)
+    except RuntimeError as e:
+        # call failed or the model ignored JSON mode — show the raw reply
+        return {"explanation": str(e), "examples": [], "quiz": [], "tips": []}
+
+def lesson_to_text(sections):
+    """Flatten a lesson dict to plain text for editing and PDF export."""
+    if not isinstance(sections, dict):
+        return str(sections)
+    parts = [sections.get("explanation", "")]
+    if sections.get("examples"):
+        parts.append("\nExamples:")
+        parts += [f"- {ex}" for ex in sections["examples"]]
+    if sections.get("quiz"):
+        parts.append("\nMini Quiz:")
+        for i, item in enumerate(sections["quiz"], 1):
+            if isinstance(item, dict):
+                parts.append(f"{i}. {item.get('q', '')}")
+                parts.append(f"   Answer: {item.get('a', '')}")
+            else:
+                parts.append(f"{i}. {item}")
+    if sections.get("tips"):
+        parts.append("\nLearning Tips:")
+        parts += [f"- {tip}" for tip in sections["tips"]]
+    return "\n".join(p for p in parts if p)
 
 # -------------------------
 # STORY AGENT ENGINE
 # -------------------------
-def generate_story(prompt):
-    system = (
-        "You are a kids' story writer. Write safe, fun, simple, moral-based stories for ages 4–12. "
-        "Use emojis, short paragraphs, friendly dialogue, and end with a clear moral."
-    )
-    full_prompt = f"{system}\n\nStory request:\n{prompt}"
-    return groq_chat(full_prompt, temperature=0.8)
+_STORY_SYS = (
+    "You are a kids' story writer. Write safe, fun, simple, moral-based stories for ages 4–12. "
+    "Use emojis, short paragraphs, friendly dialogue, and end with a clear moral."
+)
+
+def generate_story(prompt, stream=False):
+    if isinstance(prompt, (list, tuple)):
+        return groq_chat_many(["".join((_STORY_SYS, "\n\nStory request:\n", p)) for p in prompt],
+                              temperature=0.8, cache_texts=list(prompt), cache_scope="story")
+    full_prompt = "".join((_STORY_SYS, "\n\nStory request:\n", prompt))
+    if stream:
+        return groq_chat_stream(full_prompt, temperature=0.8, cache_text=prompt, cache_scope="story")
+    return groq_chat(full_prompt, temperature=0.8, cache_text=prompt, cache_scope="story")
 
 # -------------------------
 # CREW-LIKE HELPER (Groq-backed)
 # -------------------------
+_CREW_SYS = (
+    "You are a helpful multi-step assistant (Crew-like). Break down the task, "
+    "give step-by-step guidance, and provide a short actionable result."
+)
+
 def crew_ai_helper_using_groq(user_query: str, role_hint: str = None):
     """
-    Simulates a lightweight 'Crew' helper by dispatching a structured prompt to Groq.
-    Keeps things simple and avoids the crewa i package / LiteLLM dependency.
+    Simulates a lightweight 'Crew' helper by dispatching plan and answer
+    prompts to Groq concurrently, so latency is max(plan, answer) rather
+    than one long serialized response. Returns {"plan", "answer"}; the
+    plan call is skipped entirely when no role hint is given. Keeps things
+    simple and avoids the crewai package / LiteLLM dependency.
     """
-    system = "You are a helpful multi-step assistant (Crew-like). Break down the task, give step-by-step guidance, and provide a short actionable result."
-    if role_hint:
-        system += f" You should act as: {role_hint}."
-    prompt = f"{system}\n\nUser request:\n{user_query}\n\nReturn a clear step-by-step plan and a short concise answer."
-    return groq_chat(prompt, temperature=0.45)
+    system = _CREW_SYS if not role_hint else "".join((_CREW_SYS, " You should act as: ", role_hint, "."))
+    answer_prompt = "".join((system, "\n\nUser request:\n", user_query,
+                             "\n\nReturn a short, concise, actionable answer."))
+
+    # plan and answer get distinct scopes so a near-repeat query can never
+    # be served the cached answer in the plan slot (or vice versa)
+    role_key = role_hint or ""
+    async def _run():
+        if role_hint is None:
+            return None, await agroq_chat(answer_prompt, temperature=0.45,
+                                          cache_text=user_query, cache_scope=f"crew-answer|{role_key}")
+        plan_prompt = "".join((system, "\n\nUser request:\n", user_query,
+                               "\n\nReturn a clear numbered step-by-step plan only."))
+        return await asyncio.gather(
+            agroq_chat(plan_prompt, temperature=0.45,
+                       cache_text=user_query, cache_scope=f"crew-plan|{role_key}"),
+            agroq_chat(answer_prompt, temperature=0.45,
+                       cache_text=user_query, cache_scope=f"crew-answer|{role_key}"),
+        )
+
+    plan, answer = _run_async(_run())
+    return {"plan": plan, "answer": answer}
 
 # -------------------------
 # PDF GENERATOR
 # -------------------------
-def generate_pdf(title, body):
+# One-pass XML escape + newline -> <br/> (str.translate runs in C).
+_PDF_TABLE = str.maketrans({
+    "&": "&amp;",
+    "<": "&lt;",
+    ">": "&gt;",
+    '"': "&quot;",
+    "'": "&#39;",
+    "\n": "<br/>",
+})
+
+# ReportLab pulls in hundreds of submodules on import and dominates the
+# Streamlit cold start, so defer it until the first PDF is actually built.
+_RL = None
+
+def _load_reportlab():
+    global _RL
+    if _RL is None:
+        from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+        from reportlab.lib.pagesizes import A4
+        from reportlab.lib.styles import ParagraphStyle
+        from reportlab.lib import colors
+        from reportlab.lib.units import mm
+        _RL = {
+            "SimpleDocTemplate": SimpleDocTemplate,
+            "Paragraph": Paragraph,
+            "Spacer": Spacer,
+            "A4": A4,
+            "margin": 20 * mm,
+            "TITLE_STYLE": ParagraphStyle(
+                "title",
+                fontName="Helvetica-Bold",
+                fontSize=20,
+                textColor=colors.HexColor("#4a90e2"),
+                spaceAfter=12,
+            ),
+            "BODY_STYLE": ParagraphStyle(
+                "body",
+                fontName="Helvetica",
+                fontSize=12,
+                leading=16,
+            ),
+        }
+    return _RL
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def generate_pdf(title: str, body: str) -> bytes:
+    rl = _load_reportlab()
     buffer = io.BytesIO()
-    doc = SimpleDocTemplate(
+    doc = rl["SimpleDocTemplate"](
         buffer,
-        pagesize=A4,
-        leftMargin=20*mm,
-        rightMargin=20*mm,
-        topMargin=20*mm,
-        bottomMargin=20*mm
-    )
-
-    title_style = ParagraphStyle(
-        "title",
-        fontName="Helvetica-Bold",
-        fontSize=20,
-        textColor=colors.HexColor("#4a90e2"),
-        spaceAfter=12,
-    )
-    body_style = ParagraphStyle(
-        "body",
-        fontName="Helvetica",
-        fontSize=12,
-        leading=16,
+        pagesize=rl["A4"],
+        leftMargin=rl["margin"],
+        rightMargin=rl["margin"],
+        topMargin=rl["margin"],
+        bottomMargin=rl["margin"]
     )
 
     story = [
-        Paragraph(escape(title), title_style),
-        Spacer(1, 10),
-        Paragraph(escape(body).replace("\n", "<br/>"), body_style),
+        rl["Paragraph"](title.translate(_PDF_TABLE), rl["TITLE_STYLE"]),
+        rl["Spacer"](1, 10),
+    ]
+    # one flowable per paragraph so ReportLab page-breaks between them
+    # instead of re-wrapping a single huge Paragraph across pages
+    story += [
+        rl["Paragraph"](p.translate(_PDF_TABLE), rl["BODY_STYLE"])
+        for p in body.split("\n\n") if p.strip()
     ]
 
     doc.build(story)
@@ -159,16 +614,33 @@ with tab1:
         if not topic or not topic.strip():
             st.error("Please enter a topic.")
         else:
-            prompt = (
-                f"Topic: {topic}\nDifficulty: {difficulty}\n"
-                "Explain step-by-step with emojis, 1–2 examples, a short fun quiz (2 questions), and learning tips."
-            )
-            lesson = ask_tutor(prompt)
-            st.session_state["lesson"] = lesson
+            sections = ask_tutor(topic, difficulty)
+            st.session_state["lesson_sections"] = sections
+            st.session_state["lesson"] = lesson_to_text(sections)
             st.success("Lesson Ready!")
 
     if st.session_state.get("lesson"):
         st.subheader("📘 Your Lesson")
+        sections = st.session_state.get("lesson_sections") or {}
+        if sections.get("explanation"):
+            st.markdown(sections["explanation"])
+        if sections.get("examples"):
+            st.markdown("**✏️ Examples**")
+            for ex in sections["examples"]:
+                st.markdown(f"- {ex}")
+        if sections.get("quiz"):
+            st.markdown("**📝 Mini Quiz**")
+            for i, item in enumerate(sections["quiz"], 1):
+                if isinstance(item, dict):
+                    st.markdown(f"{i}. {item.get('q', '')}")
+                    with st.expander("Show answer"):
+                        st.markdown(item.get("a", ""))
+                else:
+                    st.markdown(f"{i}. {item}")
+        if sections.get("tips"):
+            st.markdown("**💡 Learning Tips**")
+            for tip in sections["tips"]:
+                st.markdown(f"- {tip}")
         edited_lesson = st.text_area("Edit lesson (optional)", st.session_state["lesson"], height=300)
         pdf_bytes = generate_pdf(topic or "Lesson", edited_lesson)
         st.download_button("📄 Download Lesson PDF", data=pdf_bytes, file_name="lesson.pdf", mime="application/pdf")
@@ -188,7 +660,7 @@ with tab2:
             st.error("Please enter a topic.")
         else:
             prompt = f"Write a {story_type.lower()} for kids about: {story_topic}. Use emojis, simple language, dialogues, and end with a moral."
-            story = generate_story(prompt)
+            story = st.write_stream(generate_story(prompt, stream=True))
             st.session_state["story"] = story
             st.success("Story Generated!")
 
@@ -210,7 +682,10 @@ with tab3:
             try:
                 reply = crew_ai_helper_using_groq(query, role_hint=role_hint.strip() or None)
                 st.subheader("🧠 Helper Response")
-                st.write(reply)
+                if reply.get("plan"):
+                    with st.expander("📋 Step-by-step plan", expanded=True):
+                        st.write(reply["plan"])
+                st.write(reply["answer"])
             except Exception as e:
                 st.error("Helper failed:")
                 st.code(str(e))